@@ -1,67 +1,206 @@
+import os
+import sys
+
+import matplotlib
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
+from functools import lru_cache
+from pathlib import Path
 
-# Load the data from CSV
-# Replace 'data.csv' with the actual path to your CSV file
-data = pd.read_csv('atomic_queue_memory_usage.csv')
+# PyArrow is optional: without it the CSV is parsed by pandas and the Parquet
+# cache is skipped
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+except ImportError:
+    pa = None
 
-# Rename columns for easier handling if necessary
-data.rename(columns={
+# Columns to load and the short names used for them below
+columns = {
     'Reclamation Scheme': 'scheme',
     'Operation': 'operation',
-    'Memory Free Change (KB)': 'free_memory',
-    'Memory Before (KB)': 'memory_before',
-    'Memory After (KB)': 'memory_after'
-}, inplace=True)
+    'Memory Free Change (KB)': 'free_memory'
+}
+
+# Parse the CSV, keeping only the columns we need
+def ingest(csv_path):
+    if pa is None:
+        data = pd.read_csv(csv_path, usecols=list(columns),
+                           dtype={'Reclamation Scheme': 'category', 'Operation': 'category'})
+        data = data.rename(columns=columns)
+        data['free_memory'] = data['free_memory'].str[:-3].astype(float)
+        return data
+
+    read_options = pacsv.ReadOptions(use_threads=True, block_size=1 << 20)
+    # Dictionary-encode scheme and operation while parsing so they arrive in
+    # pandas as categoricals and filtering compares integer codes
+    category = pa.dictionary(pa.int32(), pa.string())
+    convert_options = pacsv.ConvertOptions(
+        include_columns=list(columns),
+        column_types={'Reclamation Scheme': category, 'Operation': category})
+    table = pacsv.read_csv(csv_path, read_options=read_options,
+                           convert_options=convert_options)
+    table = table.rename_columns([columns[name] for name in table.column_names])
+
+    # Slice the trailing ' KB' off the memory column and convert to numeric
+    index = table.schema.get_field_index('free_memory')
+    values = pc.utf8_slice_codeunits(table['free_memory'], 0, -3).cast(pa.float64())
+    table = table.set_column(index, 'free_memory', values)
+
+    return table.to_pandas()
+
+# Load the cleaned data from a sibling Parquet file, parsing the CSV (and
+# refreshing the cache) only when the CSV is newer; repeated loads of an
+# unchanged trace within one process are served from memory
+def load_trace(csv_path):
+    csv_path = Path(csv_path).resolve()
+    # Key the memo on the CSV's mtime so a regenerated trace is reloaded, and
+    # hand out copies so callers cannot modify the memoised frame
+    return _load_trace(csv_path, csv_path.stat().st_mtime_ns).copy()
+
+@lru_cache(maxsize=8)
+def _load_trace(csv_path, mtime):
+    if pa is None:
+        return ingest(csv_path)
+    cache_path = csv_path.with_suffix('.parquet')
+    if cache_path.exists() and cache_path.stat().st_mtime >= csv_path.stat().st_mtime:
+        try:
+            return pd.read_parquet(cache_path, engine='pyarrow')
+        except (OSError, pa.ArrowException):
+            pass  # unreadable cache, rebuild it from the CSV
+    data = ingest(csv_path)
+
+    # The cache is only an optimisation: write it atomically so an interrupted
+    # run never leaves a truncated file behind, and ignore failures to write it
+    tmp_path = cache_path.with_name(f'{cache_path.name}.{os.getpid()}.tmp')
+    try:
+        data.to_parquet(tmp_path, engine='pyarrow', compression='zstd', use_dictionary=True)
+        os.replace(tmp_path, cache_path)
+    except (OSError, pa.ArrowException):
+        tmp_path.unlink(missing_ok=True)
+    return data
+
+# Traces combined by save_feather and load_combined by default
+trace_paths = ['atomic_queue_memory_usage.csv', 'lockfree_queue_memory_usage.csv']
 
-# Remove 'KB' from relevant columns and convert to numeric
-data['free_memory'] = data['free_memory'].str.replace(' KB', '').astype(float)
-data['memory_before'] = data['memory_before'].str.replace(' KB', '').astype(float)
-data['memory_after'] = data['memory_after'].str.replace(' KB', '').astype(float)
+# Write the cleaned traces to a single Feather file for interactive reuse
+def save_feather(csv_paths=trace_paths, output='memory_usage.feather'):
+    if pa is None:
+        raise ImportError('writing Feather files requires pyarrow')
+    traces = {Path(path).stem.removesuffix('_memory_usage'): load_trace(path)
+              for path in csv_paths}
+    data = pd.concat(traces, names=['benchmark']).reset_index(level='benchmark')
+    for name in ['benchmark', 'scheme', 'operation']:
+        data[name] = data[name].astype('category')
+    data = data.reset_index(drop=True)
 
-# Filter data for relevant schemes and operations
-schemes = ['ref_counting', 'seize', 'crossbeam', 'hazard_pointer']
-operations = ['enqueue', 'dequeue']
-data = data[data['scheme'].isin(schemes) & data['operation'].isin(operations)]
+    output = Path(output)
+    tmp_path = output.with_name(f'{output.name}.{os.getpid()}.tmp')
+    try:
+        data.to_feather(tmp_path)
+        os.replace(tmp_path, output)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return data
+
+# Load the combined traces from the Feather file written by save_feather,
+# rewriting it first if it is missing, unreadable or older than any CSV
+def load_combined(csv_paths=trace_paths, output='memory_usage.feather'):
+    if pa is None:
+        raise ImportError('reading Feather files requires pyarrow')
+    output = Path(output)
+    if output.exists() and all(output.stat().st_mtime >= Path(path).stat().st_mtime
+                               for path in csv_paths):
+        try:
+            return pd.read_feather(output, use_threads=True)
+        except (OSError, pa.ArrowException):
+            pass  # unreadable file, rebuild it from the traces
+    return save_feather(csv_paths, output)
 
 # Aggregate data to reduce density (e.g., average every 10 rows)
-def aggregate_data(subset, interval=10):
-    numeric_columns = subset.select_dtypes(include=[np.number])
-    aggregated = numeric_columns.groupby(numeric_columns.index // interval).mean()
-    return aggregated
-
-# Separate data by operation and aggregate
-enqueue_lines = []
-dequeue_lines = []
-for scheme in schemes:
-    for operation in operations:
-        subset = data[(data['scheme'] == scheme) & (data['operation'] == operation)].copy()
-        subset.reset_index(drop=True, inplace=True)
-        aggregated = aggregate_data(subset)
-        if operation == 'enqueue':
-            enqueue_lines.append((aggregated, f"{scheme} ({operation})"))
-        else:
-            dequeue_lines.append((aggregated, f"{scheme} ({operation})"))
-
-# Plot enqueue operations
-plt.figure(figsize=(12, 8))
-for subset, label in enqueue_lines:
-    plt.plot(subset.index, subset['free_memory'], label=label)
-plt.xlabel('Index (aggregated)')
-plt.ylabel('Memory Free Change (KB)')
-plt.title('Change in Free Memory Over Time (Enqueue Operations)')
-plt.legend()
-plt.grid(True)
-plt.show()
-
-# Plot dequeue operations
-plt.figure(figsize=(12, 8))
-for subset, label in dequeue_lines:
-    plt.plot(subset.index, subset['free_memory'], label=label)
-plt.xlabel('Index (aggregated)')
-plt.ylabel('Memory Free Change (KB)')
-plt.title('Change in Free Memory Over Time (Dequeue Operations)')
-plt.legend()
-plt.grid(True)
-plt.show()
+def aggregate_data(subset, value_col, interval=10):
+    values = subset[value_col].to_numpy()
+    n = (values.size // interval) * interval
+    means = values[:n].reshape(-1, interval).mean(axis=1)
+    if n < values.size:
+        means = np.append(means, values[n:].mean())
+    return means
+
+# Downsample a series with Largest-Triangle-Three-Buckets, keeping the points
+# that preserve its visual shape (only the plotted series is downsampled)
+def lttb(x, y, n_out):
+    size = len(x)
+    if n_out >= size or n_out < 3:
+        return x, y
+    bins = np.linspace(1, size - 1, n_out - 1).astype(int)
+    indices = np.zeros(n_out, dtype=int)
+    indices[-1] = size - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = bins[i], bins[i + 1]
+        next_end = bins[i + 2] if i + 2 < n_out - 1 else size
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a])
+                       - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(areas.argmax())
+        indices[i + 1] = a
+    return x[indices], y[indices]
+
+# Separate data by operation and aggregate, partitioning in a single pass
+def group_lines(data, value_col):
+    lines = {}
+    for (scheme, operation), subset in data.groupby(['scheme', 'operation'], sort=False, observed=True):
+        aggregated = aggregate_data(subset, value_col)
+        lines.setdefault(operation, []).append((aggregated, f"{scheme} ({operation})"))
+    return lines
+
+# Plot one aggregated line per scheme, saving to output if given and showing
+# the figure otherwise
+def plot_by_scheme(lines, value_col, title, output=None):
+    plt.figure(figsize=(12, 8))
+    for means, label in lines:
+        x, y = lttb(np.arange(means.size), means, 2000)
+        plt.plot(x, y, label=label, rasterized=True)
+    plt.xlabel('Index (aggregated)')
+    plt.ylabel(next(name for name, short in columns.items() if short == value_col))
+    plt.title(title)
+    plt.legend()
+    plt.grid(True)
+    if output is not None:
+        plt.savefig(output, dpi=300)
+        plt.close()
+    else:
+        plt.show()
+
+if __name__ == '__main__':
+    # Without a display there is nowhere to show figures, so skip GUI backend
+    # start-up and write them to PNG files instead (unless MPLBACKEND is set)
+    headless = sys.platform.startswith('linux') and not (
+        os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+    if headless and 'MPLBACKEND' not in os.environ:
+        matplotlib.use('Agg')
+
+    # --feather only refreshes the combined Feather file for interactive use
+    if '--feather' in sys.argv[1:]:
+        load_combined()
+        sys.exit()
+
+    # Load the data
+    # Replace 'atomic_queue_memory_usage.csv' with the actual path to your CSV file
+    data = load_trace('atomic_queue_memory_usage.csv')
+
+    # Filter data for relevant schemes and operations
+    schemes = ['ref_counting', 'seize', 'crossbeam', 'hazard_pointer']
+    operations = ['enqueue', 'dequeue']
+    data = data[data['scheme'].isin(schemes) & data['operation'].isin(operations)]
+
+    lines = group_lines(data, 'free_memory')
+    plot_by_scheme(lines.get('enqueue', []), 'free_memory',
+                   'Change in Free Memory Over Time (Enqueue Operations)',
+                   'atomic_queue_enqueue.png' if headless else None)
+    plot_by_scheme(lines.get('dequeue', []), 'free_memory',
+                   'Change in Free Memory Over Time (Dequeue Operations)',
+                   'atomic_queue_dequeue.png' if headless else None)